@@ -5,14 +5,38 @@ Generates JSON file ready to be imported by pam project import command
 from __future__ import annotations
 
 import argparse
+import asyncio
 import copy
 import csv
+import itertools
 import json
+import mmap
 import os
 import sys
-import uuid
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional - stdlib json is used when unavailable
+    orjson = None
+
+_DEFAULT_PAM_OPTIONS = {
+    "rotation": "on",
+    "connections": "on",
+    "tunneling": "on",
+    "graphical_session_recording": "on"
+}
+_DEFAULT_ROTATION_SETTINGS = {
+    "rotation": "general",
+    "enabled": "on",
+    "schedule": {"type": "on-demand"}
+}
+
+# WinRM over HTTPS - same port the generated pamMachine records use
+_PROBE_PORT = 5986
+_PROBE_TIMEOUT = 3.0
+_PROBE_LIMIT = 512  # max in-flight connection attempts
 
 
 DEFAULT_IMPORT_TEMPLATE = """{
@@ -112,6 +136,8 @@ def _build_cli() -> argparse.ArgumentParser:
                    help="Show sample JSON template (overrides all options)")
     p.add_argument("-p", "--prefix-names", action="store_true",
                    help="Enable username prefixes (server1-admin vs admin)")
+    p.add_argument("-c", "--check-connectivity", action="store_true",
+                   help=f"Probe each server on port {_PROBE_PORT} before generating")
     return p
 
 
@@ -128,100 +154,220 @@ def _load_template(path: str) -> Dict[str, Any]:
     return res
 
 
+_CSV_FIELDS = ["hostname", "username", "password"]
+
+
 def _read_csv(path: str) -> List[Dict[str, str]]:
     full_path = os.path.abspath(os.path.expanduser(path))
     if not os.path.isfile(full_path):
         print(f"CSV file not found: {path}", )
         sys.exit(2)
-    fieldnames = ["hostname", "username", "password"]
+    try:
+        return _read_csv_pandas(full_path)
+    except ImportError:
+        return _read_csv_stdlib(full_path)
+
+
+def _read_csv_pandas(full_path: str) -> List[Dict[str, str]]:
+    """ Parse the CSV with the pandas C engine - much faster on large files """
+    import pandas as pd
+
+    df = pd.read_csv(full_path, header=None, names=_CSV_FIELDS,
+                     usecols=[0, 1, 2], dtype=str, na_filter=False, engine="c")
+    for col in _CSV_FIELDS:
+        df[col] = df[col].str.strip()
+    if len(df) and list(df.iloc[0]) == _CSV_FIELDS:  # skip header row if present
+        df = df.iloc[1:]
+    mask = (df != "").all(axis=1)
+    dropped = int((~mask).sum())
+    if dropped:
+        print(f"{dropped} incomplete rows - skipped")
+    df = df[mask]
+    dup_mask = df.duplicated(subset="hostname", keep="first")
+    if dup_mask.any():
+        print(f"Duplicate hostnames skipped: {df.loc[dup_mask, 'hostname'].tolist()}")
+        df = df[~dup_mask]
+    return df.to_dict("records")
+
+
+def _read_csv_stdlib(full_path: str) -> List[Dict[str, str]]:
+    rows = _mmap_rows(full_path)
+    if rows is None:  # quoted fields need the csv state machine
+        with open(full_path, encoding="utf-8", newline="") as fp:
+            return _clean_rows(csv.reader(fp))
+    return _clean_rows(rows)
+
+
+def _mmap_rows(full_path: str) -> Optional[List[List[str]]]:
+    """ Tokenize an unquoted CSV with C-level splitlines/split via mmap """
+    with open(full_path, "rb") as fp:
+        try:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return []
+        with mm:
+            if mm.find(b'"') != -1:
+                return None
+            return [line.decode("utf-8").split(",")
+                    for line in mm[:].splitlines() if line]
+
+
+def _clean_rows(rows: Iterable[List[str]]) -> List[Dict[str, str]]:
     out: List[Dict[str, str]] = []
-    with open(full_path, encoding="utf-8") as fp:
-        reader = csv.DictReader(fp, fieldnames=fieldnames)
-        header_row = next(reader)  # skip header row if present
-        if list(header_row.values()) != fieldnames:
-            fp.seek(0)
-            reader = csv.DictReader(fp, fieldnames=fieldnames)
-        for line_no, row in enumerate(reader, 0):
-            h, u, p = (row.get("hostname", "").strip(),
-                       row.get("username", "").strip(),
-                       row.get("password", "").strip())
-            if not all((h, u, p)):
-                print(f"Row {line_no} incomplete - skipped")
-                continue
-            out.append({"hostname": h, "username": u, "password": p})
+    out_append = out.append
+    it = iter(rows)
+    header_row = next(it, None)  # skip header row if present
+    if header_row is None:
+        return out
+    if header_row != _CSV_FIELDS:
+        it = itertools.chain([header_row], it)
+    seen: set[str] = set()
+    for line_no, row in enumerate(it, 0):
+        if not row:
+            continue
+        if len(row) < 3:
+            print(f"Row {line_no} incomplete - skipped")
+            continue
+        h, u, p = row[0].strip(), row[1].strip(), row[2].strip()
+        if not all((h, u, p)):
+            print(f"Row {line_no} incomplete - skipped")
+            continue
+        if h in seen:
+            print(f"Duplicate hostname {h} - skipped")
+            continue
+        seen.add(h)
+        out_append({"hostname": h, "username": u, "password": p})
     return out
 
 
-def _gen_data(csv: List[Dict[str, str]],
-              template: Dict[str, Any],
-              prefix_names: bool) -> List[Dict]:
-
-    data = copy.deepcopy(template)
-
-    # pop out pamMachine template
+async def _probe_async(host: str, port: int = _PROBE_PORT,
+                       timeout: float = _PROBE_TIMEOUT) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def _gather_probes(hosts: List[str], port: int = _PROBE_PORT) -> List[str]:
+    """ Probe all hosts concurrently, return the unreachable ones """
+    sem = asyncio.Semaphore(_PROBE_LIMIT)
+
+    async def _bounded(host: str):
+        async with sem:
+            return host, await _probe_async(host, port)
+
+    unreachable: List[str] = []
+    for fut in asyncio.as_completed([_bounded(h) for h in hosts]):
+        host, ok = await fut
+        if not ok:
+            print(f"Host {host} unreachable on port {port}")
+            unreachable.append(host)
+    return unreachable
+
+
+def check_connectivity(rows: List[Dict[str, str]]) -> None:
+    hosts = [row["hostname"] for row in rows]
+    print(f"Checking connectivity to {len(hosts)} servers on port {_PROBE_PORT}")
+    unreachable = asyncio.run(_gather_probes(hosts))
+    if unreachable:
+        print(f"{len(unreachable)} of {len(hosts)} servers unreachable - "
+              "records will still be generated")
+
+
+def _pop_machine_template(data: Dict[str, Any]) -> Dict[str, Any]:
+    """ Pop the pamMachine entry out of pam_data.resources """
     rsrs = data.get("pam_data", {}).get("resources") or []
     idx = next((i for i, item in enumerate(rsrs) if str(item.get("type")) == "pamMachine"), None)
     tmpl = rsrs.pop(idx) if idx is not None else {}
     if not tmpl:
         print("Unable to find pamMachine template")
         sys.exit(5)
-
-    seen: set[str] = set()
-    for row in csv:
+    return tmpl
+
+
+def _gen_machines(rows: List[Dict[str, str]],
+                  tmpl: Dict[str, Any],
+                  prefix_names: bool) -> Iterator[Dict[str, Any]]:
+    """ Yield one pamMachine record per CSV row (rows are already deduped) """
+    # fill template defaults once - every per-row deepcopy inherits them,
+    # so the loop below only assigns the fields that vary per host
+    tmpl["pam_settings"].setdefault("options", _DEFAULT_PAM_OPTIONS)
+    tmpl["users"] = tmpl.get("users") or []
+    for usr in tmpl["users"]:
+        usr.setdefault("type", "pamUser")
+        usr.setdefault("rotation_settings", _DEFAULT_ROTATION_SETTINGS)
+
+    # prefix_names is constant for the whole run - pick the title
+    # formatter once instead of re-testing the flag per user
+    if prefix_names:
+        def _title(host: str, user: str) -> str:
+            return f"{host}-{user}"
+    else:
+        def _title(host: str, user: str) -> str:
+            return host
+
+    for row in rows:
         mach = copy.deepcopy(tmpl)
         user = row["username"]
         password = row["password"]
         host = row["hostname"]
 
-        if host in seen:
-            print(f"Duplicate hostname {host} - skipped")
-            continue
-        seen.add(host)
-
         # pamMachine
         mach["title"] = host
         mach["host"] = host
-        if "options" not in mach["pam_settings"]:
-            mach["pam_settings"]["options"] = {
-                "rotation": "on",
-                "connections": "on",
-                "tunneling": "on",
-                "graphical_session_recording": "on"
-            }
 
         # pamUser
-        users = mach.get("users") or []
-        for usr in users:
-            if "type" not in usr:
-                usr["type"] = "pamUser"
-            usr["title"] = f"{host}-{user}" if prefix_names else host
+        title = _title(host, user)
+        for usr in mach["users"]:
+            usr["title"] = title
             usr["login"] = user
             usr["password"] = password
-            if "rotation_settings" not in usr:
-                usr["rotation_settings"] = {
-                    "rotation": "general",
-                    "enabled": "on",
-                    "schedule": {"type": "on-demand"}
-                }
-        mach["users"] = users
-        rsrs.append(mach)
-
-    data["pam_data"]["resources"] = rsrs
-    return data
-
-
-def _write(fpath: Path, content: str):
-    with fpath.open("w", encoding="utf-8") as fp:
-        fp.write(content)
+        yield mach
+
+
+def _dump_machine(mach: Dict[str, Any], indent: bytes) -> bytes:
+    """ Serialize one record to indented UTF-8 bytes """
+    if orjson is not None:
+        raw = orjson.dumps(mach, option=orjson.OPT_INDENT_2)
+    else:
+        raw = json.dumps(mach, indent=2).encode("utf-8")
+    return raw.replace(b"\n", b"\n" + indent)
+
+
+def write_import_json(data: Dict[str, Any],
+                      machines: Iterator[Dict[str, Any]], path: str):
+    """ Stream the generated JSON to file - one pamMachine record at a time """
+    fpath = Path(path)
+    # split the serialized template at a throw-away marker so machine
+    # records can be streamed into pam_data.resources without ever
+    # materializing the full list (or the full JSON string) in memory
+    marker = os.urandom(16).hex()
+    rsrs = data["pam_data"]["resources"]
+    rsrs.append(marker)
+    head, tail = json.dumps(data, indent=2).split(f'"{marker}"')
+    rsrs.pop()
+    indent = b" " * 6  # depth of pam_data.resources[] items
+    sep = b",\n" + indent
+    with fpath.open("wb", buffering=1 << 20) as fp:
+        first = next(machines, None)
+        if first is None:
+            fp.write(head.rstrip().rstrip(",").encode("utf-8"))
+        else:
+            fp.write(head.encode("utf-8"))
+            fp.write(_dump_machine(first, indent))
+            for mach in machines:
+                fp.write(sep)
+                fp.write(_dump_machine(mach, indent))
+        fp.write(tail.encode("utf-8"))
     print(f"Wrote {fpath}")
 
 
-def write_import_json(data: List[Dict], path: str):
-    """ Generate JSON and save to file"""
-    content = json.dumps(data, indent=2)
-    _write(Path(path), content)
-
-
 def prepare_temlpate(template: Dict[str, Any]) -> None:
     """ Prepare JSON template - populate missing defaults """
     tdic = json.loads(DEFAULT_IMPORT_TEMPLATE)
@@ -282,10 +428,13 @@ def main():
     rows = _read_csv(args.input_file)
     tmpl = _load_template(args.template_file)
     prepare_temlpate(tmpl)
+    if args.check_connectivity:
+        check_connectivity(rows)
     print(f"Processing {len(rows)} servers")
 
-    data = _gen_data(rows, tmpl, args.prefix_names)
-    write_import_json(data, args.output_file)
+    mach_tmpl = _pop_machine_template(tmpl)
+    machines = _gen_machines(rows, mach_tmpl, args.prefix_names)
+    write_import_json(tmpl, machines, args.output_file)
     print(f"Import with `pam project import -f={args.output_file}")
 
 